@@ -13,7 +13,7 @@ import shlex
 import tempfile
 import time
 import zipfile
-from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 from enum import Enum
 from mimetypes import guess_type
@@ -23,6 +23,7 @@ from string import Template
 from typing import Optional
 
 import httpx_cache
+import orjson
 import pandas
 import papermill
 import requests
@@ -33,11 +34,15 @@ from fastapi import APIRouter, Body, HTTPException, Request, Response
 from fastapi.responses import PlainTextResponse, StreamingResponse
 from requests.exceptions import ReadTimeout
 
-from .azcli import adx_query, azcli, cache, clean_path, logger, settings, submit
-from .proxy import httpx_client
+from .azcli import adx_query, azcli, cache, clean_path, httpx_client, logger, settings, submit
 
 router = APIRouter()
 
+# dedicated pool for blob uploads - upload_results itself runs as a task on the shared
+# executor, so blocking there on same-pool subtasks could deadlock once all workers
+# are occupied by waiting parents
+upload_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="upload")
+
 
 class OutputFormat(str, Enum):
     """
@@ -79,9 +84,9 @@ def datalake_json(path: str, content=None, modified_key: Optional[str] = None) -
     # retrieves or uploads a json file from the datalake
     path = settings("datalake_path") / clean_path(path)
     if content is None:
-        return json.loads(path.read_text())
+        return orjson.loads(path.read_bytes())
     elif path.exists():
-        existing_content = json.loads(path.read_text())
+        existing_content = orjson.loads(path.read_bytes())
         # Contrast the actual blob content for its modified time
         source_mtime, dest_mtime = isoparse(content[modified_key]), isoparse(
             existing_content[modified_key]
@@ -90,10 +95,19 @@ def datalake_json(path: str, content=None, modified_key: Optional[str] = None) -
             # if the source is older than the destination, return the destination without uploading
             return existing_content
     logger.debug(f"Uploading {path}.")
-    path.write_text(json.dumps(content, sort_keys=True, indent=2))
+    path.write_bytes(orjson.dumps(content, option=orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2))
     return content
 
 
+@cache.memoize(ttl=60 * 60 * 24)  # packaged kql content is static per release, cache 1 day
+def _load_kql_resource(query: str) -> str:
+    path = Path(__package__) / Path(clean_path(query))
+    logger.debug(f"loading kql from {path}")
+    return importlib.resources.read_text(
+        package=str(path.parent).replace("/", "."), resource=path.name
+    ).strip()
+
+
 @router.get("/loadkql", response_class=PlainTextResponse)
 @cache.memoize()
 def load_kql(query: str) -> str:
@@ -102,11 +116,7 @@ def load_kql(query: str) -> str:
     - If query starts with kql:// then load it from {KQL_BASEURL} and return text
     """
     if query.startswith("kql/"):
-        path = Path(__package__) / Path(clean_path(query))
-        logger.debug(f"loading kql from {path}")
-        query = importlib.resources.read_text(
-            package=str(path.parent).replace("/", "."), resource=path.name
-        ).strip()
+        query = _load_kql_resource(query)
     # If query starts with kql:// then load it from KQL_BASEURL
     elif query.startswith("kql://"):
         base_url = os.environ["KQL_BASEURL"]
@@ -141,12 +151,16 @@ def analytics_query(
             return azcli(cmd)  # big grouped query
         except Exception as exc:  # pylint: disable=broad-except
             logger.warning(f"{exc}: falling back to individual queries")
-    # run each query separately and stitch results, 20 at a time.
+    # warm the log analytics bearer token once so the fan-out below hits the token
+    # cache instead of racing to refresh it in every worker thread
+    azcli(["account", "get-access-token", "--resource", "https://api.loganalytics.io"])
+    # run each query separately on the shared bounded executor and stitch results as they finish
     results = []
     futures = {
-        workspace: submit(azcli, cmd_base + ["--workspace", workspace]) for workspace in workspaces
+        submit(azcli, cmd_base + ["--workspace", workspace]): workspace for workspace in workspaces
     }
-    for workspace, future in futures.items():
+    for future in as_completed(futures):
+        workspace = futures[future]
         try:
             result = future.result()
         except Exception as exc:  # pylint: disable=broad-except
@@ -189,13 +203,15 @@ def list_workspaces(fmt: OutputFormat = OutputFormat.LIST, agency="ALL"):
         return dataframe
 
 
+@cache.memoize(ttl=60 * 60)
 def workspace_details():
+    "Expanded workspace records from `/listWorkspaces`, persisted to the datalake for 3 hrs"
     details_file = settings("datalake_path") / "notebooks/lists/workspace_details.json"
     if (
         details_file.exists()
         and datetime.utcnow().timestamp() - details_file.stat().st_mtime < 60 * 60 * 3
     ):
-        return json.loads(details_file.read_text())
+        return orjson.loads(details_file.read_bytes())
     wsdetail = []
     for wsdata in list_workspaces("json"):
         customerId = wsdata["customerId"]
@@ -216,7 +232,7 @@ def workspace_details():
         ws["name"] = ws["name"].lower()
         ws["ingest_function"] = f"{ws['customerId'].replace('-', '_')}_incoming"
         wsdetail.append(ws)
-    details_file.write_text(json.dumps(wsdetail))
+    details_file.write_bytes(orjson.dumps(wsdetail))
     return wsdetail
 
 
@@ -264,19 +280,19 @@ def upload_results(results, blobdest, filenamekeys):
         return
     "Uploads a list of json results as files split by timegenerated to a blob destination"
     blobdest = clean_path(blobdest)
-    with ThreadPoolExecutor(max_workers=32) as executor:
-        futures = []
-        for result in results:
-            dirname = f"{result['TimeGenerated'].split('T')[0]}"
-            filename = "_".join([result[key] for key in filenamekeys.split(",")]) + ".json"
-            futures.append(
-                executor.submit(
-                    datalake_json,
-                    path=f"{blobdest}/{dirname}/{filename}",
-                    content=result,
-                    modified_key="TimeGenerated",
-                )
+    futures = []
+    for result in results:
+        dirname = f"{result['TimeGenerated'].split('T')[0]}"
+        filename = "_".join([result[key] for key in filenamekeys.split(",")]) + ".json"
+        futures.append(
+            upload_executor.submit(
+                datalake_json,
+                path=f"{blobdest}/{dirname}/{filename}",
+                content=result,
+                modified_key="TimeGenerated",
             )
+        )
+    wait(futures)
     logger.debug(f"Uploaded {len(results)} results.")
 
 
@@ -425,6 +441,14 @@ def summarise(blobpath: str, query: str = ExampleQuery, timespan: str = "P7D"):
     return len(results)
 
 
+def _zip_codec(payload) -> int:
+    """
+    Picks a zip member codec by payload size - deflate setup costs more than it
+    saves below ~1 KiB, so tiny members (kql text, empty results) are stored raw.
+    """
+    return zipfile.ZIP_DEFLATED if len(payload) >= 1024 else zipfile.ZIP_STORED
+
+
 def zip_data(obj: dict[pandas.DataFrame]) -> bytes:
     """
     Creates a zipped set of json files from a dict of dataframes.
@@ -443,7 +467,7 @@ def zip_data(obj: dict[pandas.DataFrame]) -> bytes:
         for name, dframe in obj.items():
             if not name.endswith(".json"):
                 txt_info = zipfile.ZipInfo(f"{name}", date_time=now)
-                zip_file.writestr(txt_info, dframe, zipfile.ZIP_DEFLATED)
+                zip_file.writestr(txt_info, dframe, _zip_codec(dframe))
                 continue
             dframe = dframe.convert_dtypes()  # enhance fields where possible
             for col, dtype in zip(dframe.columns, dframe.dtypes):
@@ -451,7 +475,10 @@ def zip_data(obj: dict[pandas.DataFrame]) -> bytes:
                     if timestr in col.lower():  # enhance dates if possible
                         if "str" in str(dtype).lower():
                             try:
-                                dframe[col] = pandas.to_datetime(dframe[col])
+                                # inferring the format once avoids per-value parsing
+                                dframe[col] = pandas.to_datetime(
+                                    dframe[col], infer_datetime_format=True
+                                )
                             except ValueError:
                                 pass
                         elif "int" in str(dtype).lower():
@@ -463,7 +490,7 @@ def zip_data(obj: dict[pandas.DataFrame]) -> bytes:
                     dframe[col] = dframe[col].astype("string")
             json_info = zipfile.ZipInfo(f"{name}", date_time=now)
             json_str = dframe.to_json(orient="records", date_format="iso")
-            zip_file.writestr(json_info, json_str, zipfile.ZIP_DEFLATED)
+            zip_file.writestr(json_info, json_str, _zip_codec(json_str))
     return zip_bytes.getvalue()
 
 
@@ -477,14 +504,21 @@ def load_dataframes(path: AnyPath) -> dict[pandas.DataFrame]:
     Returns:
         dict[pandas.DataFrame]: Dictionary of dataframes
     """
-    logger.debug(f"Decompressing {path}")
-    obj = {}
-    with zipfile.ZipFile(path, "r") as mem_zipfile:
-        for name in mem_zipfile.namelist():
-            if name.endswith(".json"):
-                with mem_zipfile.open(name) as json_file:
-                    obj[name[:-5]] = pandas.read_json(json_file, orient="records")
-    return obj
+    # keyed on path + mtime so a rewritten cache zip invalidates immediately
+    cache_key = ("load_dataframes", str(path), path.stat().st_mtime)
+    obj = cache.get(cache_key)
+    if obj is None:
+        logger.debug(f"Decompressing {path}")
+        obj = {}
+        with zipfile.ZipFile(path, "r") as mem_zipfile:
+            for name in mem_zipfile.namelist():
+                if name.endswith(".json"):
+                    with mem_zipfile.open(name) as json_file:
+                        obj[name[:-5]] = pandas.read_json(json_file, orient="records")
+        cache.set(cache_key, obj, ttl=60 * 60)
+    # hand out copies - callers mutate these frames in place (e.g. hash_columns
+    # anonymisation) and must not poison the cached originals
+    return {name: dframe.copy() for name, dframe in obj.items()}
 
 
 def kql2df(
@@ -506,6 +540,12 @@ def kql2df(
         data = analytics_query(workspaces=workspaces, query=kql, timespan=timespan)
         assert data and (len(data)) > 0
         data = pandas.json_normalize(data, max_level=1)
+        if "TimeGenerated" in data.columns:
+            # coerce bad timestamps to NaT - the default raise would bounce the whole
+            # result set into the broad except below and discard the queried data
+            data["TimeGenerated"] = pandas.to_datetime(
+                data["TimeGenerated"], utc=True, infer_datetime_format=True, errors="coerce"
+            )
     except ReadTimeout as exc:
         if attempt < max_attempts:
             logger.warning(f"Timeout: {exc}, retrying...")
@@ -596,6 +636,30 @@ def report_zipjson(query_config: dict, agency: str, timespan: str):
     return zip_data(report_data)
 
 
+@cache.memoize(ttl=60 * 60)
+def load_query_config(query_config_path: str) -> dict:
+    """
+    Loads the report query config and resolves each kql path to its text.
+
+    Memoized as each kql entry is a separate datalake read that rarely changes.
+
+    Args:
+        query_config_path (str): Path to the query config file.
+
+    Returns:
+        dict: The query config with kql paths replaced by query text.
+    """
+    query_config = datalake_json(query_config_path)
+    kql_base = (settings("datalake_path") / query_config_path).parent
+    # each kql file is a separate remote read - fan out on the shared executor
+    futures = {
+        query: submit((kql_base / kql_path).read_text)
+        for query, kql_path in query_config["kql"].items()
+    }
+    query_config["kql"] = {query: future.result() for query, future in futures.items()}
+    return query_config
+
+
 @router.post("/collect_report_json")
 def collect_report_json(
     query_config_path: str = "notebooks/wasoc-notebook/kql/report-queries.json",
@@ -619,11 +683,8 @@ def collect_report_json(
     - Queries can either be log analytics or http api calls
     - Responses are parsed into dataframes, then compressed and uploaded to blob storage
     """
-    query_config = datalake_json(query_config_path)
+    query_config = dict(load_query_config(query_config_path))  # copied so results stay per-call
     date = datetime.utcnow().strftime("%Y-%m")
-    kql_base = (settings("datalake_path") / query_config_path).parent
-    for query, kql_path in query_config["kql"].items():
-        query_config["kql"][query] = (kql_base / kql_path).read_text()
     agencies = list_workspaces(fmt=OutputFormat.DF).dropna(subset=["alias"])
     if agency != "ALL" and agency not in agencies["alias"].values:
         raise HTTPException(status_code=404, detail=f"Agency {agency} not found")
@@ -765,7 +826,7 @@ def upload_loganalytics_raw(rows, customer_id, shared_key, log_type):
     """
     Uploads json log analytics data to a workspace.
     """
-    body = json.dumps(rows)  # dump new rows ready for upload
+    body = orjson.dumps(rows)  # dump new rows ready for upload
     method, content_type, resource = "POST", "application/json", "/api/logs"
     rfc1123date = datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT")
     content_length = len(body)
@@ -824,6 +885,8 @@ def upload_loganalytics(rows: list[dict], log_type: str, target_workspace: str =
         for key in ["TenantId", "tenant", "TimeGenerated", "RawData"]:  # rename reserved columns
             if key in item.keys():
                 item[key + "_orig"] = item.pop(key)
+        # digest bytes must stay identical to the _row_sha256 values already persisted in
+        # the workspace, so this stays on stdlib json (orjson's compact separators differ)
         digest = hashlib.sha256(json.dumps(item, sort_keys=True).encode("utf8")).hexdigest()
         if digest not in existing_hashes:
             item[digest_column] = digest  # only add digest for new rows
@@ -831,7 +894,7 @@ def upload_loganalytics(rows: list[dict], log_type: str, target_workspace: str =
     if len(rows) == 0:
         logger.info("Nothing to upload")
         return
-    rowsize = len(json.dumps(rows[0]).encode("utf8"))
+    rowsize = len(orjson.dumps(rows[0]))
     chunk_size = int(20 * 1024 * 1024 / rowsize)  # 20MB max size
     chunks = [allrows[x : x + chunk_size] for x in range(0, len(allrows), chunk_size)]
     futures = []
@@ -896,28 +959,19 @@ def ingest_datalake_hot():
         logger.debug(
             f"Running {len(ingest_queries)} ingest queries at {datetime.now().isoformat()}"
         )
-        futures = []
         start = time.time()
-        for query in ingest_queries:
-            futures.append((query, executor.submit(adx_query, query)))
-        seconds = 0
-        while True:
-            seconds = time.time() - start
-            running = [f.running() for q, f in futures].count(True)
-            if int(seconds) % 30 == 0:
-                done = [f.done() for q, f in futures].count(True)
-                logger.debug(
-                    f"{running} running, {done} done, {len(futures)} total, time: {seconds:.1f}s"
-                )
-            if running == 0:
-                break
-            time.sleep(1)
+        futures = {executor.submit(adx_query, query): query for query in ingest_queries}
         results = []
-        for query, future in futures:
+        # collect as queries finish instead of polling every second for the barrier
+        for done, future in enumerate(as_completed(futures), start=1):
+            query = futures[future]
             if future.exception():
                 logger.error(f"{query} failed with {future.exception()}"[:300])
             else:
                 results.append(dataframe_from_result_table(future.result()))
+            if done % 30 == 0:
+                logger.debug(f"{done} done, {len(futures)} total, time: {time.time() - start:.1f}s")
+        seconds = time.time() - start
         df = pandas.concat(results)
         logger.debug(df.sum(numeric_only=True).to_string())
         hotcache = adx_query("find where isnotempty(source_ingestion_time) | count")[0]["Count"]
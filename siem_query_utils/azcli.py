@@ -9,6 +9,7 @@ import importlib
 import json
 import logging
 import os
+import threading
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -16,7 +17,9 @@ from string import Template
 from types import FunctionType
 from concurrent.futures import ThreadPoolExecutor
 
+import httpx
 import httpx_cache
+import orjson
 from azure.cli.core import get_default_cli
 from azure.storage.blob import BlobServiceClient
 from cacheout import Cache
@@ -45,12 +48,37 @@ logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
 cache = Cache(maxsize=25600, ttl=300)
 
+# One az CLI instance per thread - avoids re-constructing the CLI (argparse + extension
+# load) per invocation while still letting fan-out queries overlap their network I/O;
+# `cli.result` is mutated by invoke so instances must not be shared across threads.
+_cli_local = threading.local()
+_login_lock = threading.Lock()
+
+
+def _thread_cli():
+    """
+    Return this thread's az CLI instance, creating it on first use
+    """
+    if not hasattr(_cli_local, "cli"):
+        _cli_local.cli = get_default_cli()
+    return _cli_local.cli
+
+
+# kept open for the process lifetime - opening per invoke leaked a file descriptor each call
+_DEVNULL = open(os.devnull, "w")  # pylint: disable=consider-using-with
+
+
+# read + compile the email template once at import; bootstrap reruns on every relogin
+_EMAIL_TEMPLATE = Template(
+    importlib.resources.read_text(f"{__package__}.templates", "email-template.html")
+)
 
 app_state = {
     "logged_in": False,
     "login_time": datetime.utcnow() - timedelta(days=1),
+    "relogin_deadline": 0.0,  # monotonic deadline in the past to force relogin
     "msi_failed": os.environ.get("DISABLE_MSI", "false").lower() == "true",
-}  # last login 1 day ago to force relogin
+}
 
 
 default_session = json.dumps(
@@ -78,12 +106,45 @@ def httpx_client(proxy: dict) -> httpx_cache.Client:
     Returns:
         httpx_cache.Client: httpx client
     """
-    # cache client objects for an hour
-    proxy_client = httpx_cache.Client(**proxy, timeout=None)
+    # cache client objects for an hour, with a pool large enough that the worker
+    # threads never queue waiting for a connection and http2 multiplexing per origin
+    proxy_client = httpx_cache.Client(
+        **proxy,
+        timeout=None,
+        http2=True,
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=200),
+    )
     proxy_client.headers["host"] = proxy_client.base_url.host
     return proxy_client
 
 
+@cache.memoize(ttl=60 * 60)
+def httpx_async_client(proxy: dict) -> httpx.AsyncClient:
+    """
+    Create an async httpx client (async twin of httpx_client for the proxy)
+
+    Deliberately not httpx_cache - its caching transport accumulates response
+    bodies to store them, which would defeat pass-through streaming of large
+    payloads in the proxy.
+
+    Args:
+        proxy (dict): proxy config
+
+    Returns:
+        httpx.AsyncClient: async httpx client
+    """
+    proxy_client = httpx.AsyncClient(
+        **proxy,
+        timeout=None,
+        http2=True,
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=200),
+    )
+    proxy_client.headers["host"] = proxy_client.base_url.host
+    # precompute the redirect-rewrite prefix once rather than str(base_url) per response
+    proxy_client.base_url_slash = f"{proxy_client.base_url}/"
+    return proxy_client
+
+
 @cache.memoize(ttl=60 * 60)
 def boot(secret: str) -> str:
     """
@@ -106,6 +167,24 @@ def boot(secret: str) -> str:
     return secret["value"]
 
 
+@cache.memoize(ttl=60 * 60)
+def _fingerprint(frozen: bytes) -> tuple:
+    """
+    Base64 encode and hash a canonical json session dump
+
+    Memoized so repeat sessions with identical config skip the encode + hash
+    on the request path (the digest is a cache key, not a security control).
+
+    Args:
+        frozen (bytes): json dump of the session config with sorted keys
+
+    Returns:
+        tuple: (base64 encoded bytes, hex digest cache key)
+    """
+    encoded = base64.b64encode(frozen)
+    return encoded, hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
 def encode_session(session: dict) -> str:
     """
     Encode a session as a base64 string
@@ -116,22 +195,24 @@ def encode_session(session: dict) -> str:
     Returns:
         str: base64 encoded string
     """
-    return base64.b64encode(json.dumps(session, sort_keys=True).encode("utf8"))
+    return _fingerprint(orjson.dumps(session, option=orjson.OPT_SORT_KEYS))[0]
 
 
-def load_session(data: str = None, config: dict = json.loads(default_session)):
+def load_session(data: str = None, config: dict = None):
     """
     Decode and return a session as a json object and the base64 string for easy editing
     """
     if data is None:  # for internal python use only
         data = boot(os.environ["KEYVAULT_SESSION_SECRET"])
+    # fresh dict per call - a shared default would accumulate keys from every session loaded
+    config = json.loads(default_session) if config is None else dict(config)
     try:
-        config.update(json.loads(base64.b64decode(data)))
+        config.update(orjson.loads(base64.b64decode(data)))
     except Exception as exc:
         logger.warning(exc)
         raise HTTPException(500, "Failed to load session data") from exc
-    session = {"session": config, "base64": encode_session(config), "apis": {}}
-    session["key"] = hashlib.sha256(session["base64"]).hexdigest()
+    encoded, key = _fingerprint(orjson.dumps(config, option=orjson.OPT_SORT_KEYS))
+    session = {"session": config, "base64": encoded, "apis": {}, "key": key}
     for item, data in config.items():
         if item.startswith("proxy_"):
             # Validate proxy parameters
@@ -213,9 +294,7 @@ def bootstrap(_app_state: dict):
             "datalake_account": account,
             "datalake_container": container,
             "datalake_sas": os.environ.get("DATALAKE_SAS", False),
-            "email_template": Template(
-                importlib.resources.read_text(f"{__package__}.templates", "email-template.html")
-            ),
+            "email_template": _EMAIL_TEMPLATE,
             "datalake_path": lambda: get_blob_path(prefix, subscription),
             "email_footer": os.environ.get(
                 "FOOTER_HTML", "Set FOOTER_HTML env var to configure this..."
@@ -227,7 +306,7 @@ def bootstrap(_app_state: dict):
                 KustoConnectionStringBuilder.with_az_cli_authentication(cluster)
             ),
             "dx_db": default_dx_db,
-            "keyvault_session": lambda: load_session(boot(os.environ["KEYVAULT_SESSION_SECRET"]))
+            "keyvault_session": lambda: load_session()
             if "KEYVAULT_SESSION_SECRET" in os.environ
             else None,
             "sessions": {},
@@ -242,17 +321,12 @@ def login(refresh: bool = False):
     Args:
         refresh (bool, optional): force relogin. Defaults to False.
     """
-    cli = get_default_cli()
+    cli = _thread_cli()
     if os.environ.get("IDENTITY_HEADER") and not app_state.get("msi_failed"):
         if refresh:
-            cli.invoke(
-                ["logout", "--only-show-errors", "-o", "json"], out_file=open(os.devnull, "w")
-            )
+            cli.invoke(["logout", "--only-show-errors", "-o", "json"], out_file=_DEVNULL)
         # Use managed service identity to login
-        loginstatus = cli.invoke(
-            ["login", "--identity", "--only-show-errors", "-o", "json"],
-            out_file=open(os.devnull, "w"),
-        )
+        cli.invoke(["login", "--identity", "--only-show-errors", "-o", "json"], out_file=_DEVNULL)
         if cli.result.error:
             # bail as we aren't able to login
             logger.error(cli.result.error)
@@ -261,16 +335,18 @@ def login(refresh: bool = False):
             app_state.pop("msi_failed", None)
             app_state["logged_in"] = True
             app_state["login_time"] = datetime.utcnow()
+            app_state["relogin_deadline"] = time.monotonic() + 60 * 60
     if not os.environ.get("IDENTITY_HEADER") or app_state.get("msi_failed"):
         while not app_state["logged_in"]:
-            cli.invoke(["account", "show", "-o", "json"], out_file=open(os.devnull, "w"))
+            cli.invoke(["account", "show", "-o", "json"], out_file=_DEVNULL)
             if cli.result.result and "environmentName" in cli.result.result:
                 app_state["logged_in"] = True
                 app_state["login_time"] = datetime.utcnow()
+                app_state["relogin_deadline"] = time.monotonic() + 60 * 60
             else:
                 cli.invoke(
                     ["login", "--tenant", os.environ["TENANT_ID"], "--use-device-code"],
-                    out_file=open(os.devnull, "w"),
+                    out_file=_DEVNULL,
                 )
     # setup all other env vars
     bootstrap(app_state)
@@ -287,10 +363,14 @@ def settings(key: str):
     Returns:
         setting value
     """
-    if datetime.utcnow() - app_state["login_time"] > timedelta(hours=1):
-        login(refresh=True)
-    elif not app_state["logged_in"]:
-        login()
+    if time.monotonic() > app_state["relogin_deadline"] or not app_state["logged_in"]:
+        # single-flight the relogin - concurrent request threads all hit expiry together
+        # and az login takes tens of seconds, so only the first should perform it
+        with _login_lock:
+            if time.monotonic() > app_state["relogin_deadline"]:
+                login(refresh=True)
+            elif not app_state["logged_in"]:
+                login()
     setting = app_state[key]
     if isinstance(setting, FunctionType):
         setting = setting()
@@ -313,21 +393,22 @@ def azcli(basecmd: list, attempt: int = 0, max_attempts: int = 5):
     """
     assert settings("logged_in")
     cmd = basecmd + ["--only-show-errors", "-o", "json"]
-    cli = get_default_cli()
     for arg in cmd:
         assert isinstance(arg, str)
     logger.debug(" ".join(["az"] + cmd).replace("\n", " ").strip()[:160])
+    cli = _thread_cli()
     try:
-        cli.invoke(cmd, out_file=open(os.devnull, "w"))
+        cli.invoke(cmd, out_file=_DEVNULL)
+        error, result = cli.result.error, cli.result.result
     except (SystemExit, Exception) as exc:  # pylint: disable=broad-except
         if attempt >= max_attempts:
             raise Exception(f"Exceeded {max_attempts} CLI invocations") from exc
         logger.warning(f"CLI invocation failed: attempt {attempt}, retrying... ({exc})")
         time.sleep(1 + attempt * 2)  # exponential backoff
         return azcli(basecmd, attempt + 1, max_attempts)
-    if cli.result.error:
-        logger.warning(cli.result.error)
-    return cli.result.result
+    if error:
+        logger.warning(error)
+    return result
 
 
 @cache.memoize(ttl=60 * 60 * 24)  # cache sas tokens 1 day
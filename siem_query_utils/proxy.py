@@ -3,12 +3,15 @@ Proxy API
 """
 import json
 import os
+import re
+from functools import lru_cache
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import RedirectResponse, Response
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 
-from .azcli import default_session, encode_session, httpx_client, load_session, settings
+from .azcli import default_session, encode_session, httpx_async_client, load_session, settings
 
 router = APIRouter()
 sessions = settings("sessions")  # global cache of sessions and async clients
@@ -76,56 +79,44 @@ def apis(request: Request) -> dict:
 
 def client(request: Request, prefix: str):
     """
-    Return a httpx client for the given prefix from the session config
+    Return an async httpx client for the given prefix from the session config
     """
     if prefix not in apis(request):
         raise HTTPException(
             404,
             f"{prefix} does not have a valid configuration, see /proxy/apis for valid prefixes.",
         )
-    return httpx_client(_session(request)[f"proxy_{prefix}"])
+    return httpx_async_client(_session(request)[f"proxy_{prefix}"])
 
 
-def filter_headers(  # pylint: disable=dangerous-default-value
+@lru_cache(maxsize=None)
+def _prefix_pattern(prefixes: tuple) -> re.Pattern:
+    # compile a prefix alternation once per prefix set - matching in C beats
+    # a nested python startswith loop on every proxied request
+    return re.compile("|".join(re.escape(prefix) for prefix in prefixes), re.IGNORECASE)
+
+
+def filter_headers(
     headers: dict,
-    filtered_prefixes=["host", "cookie", "x-ms-", "x-arr-", "disguised-host", "referer"],
+    filtered_prefixes=("host", "cookie", "x-ms-", "x-arr-", "disguised-host", "referer"),
 ) -> dict:
     """
     Filter headers to remove sensitive data
 
     Args:
         headers (dict): headers to filter
-        filtered_prefixes (list, optional): prefixes to filter.
-            Defaults to ["host", "cookie", "x-ms-", "x-arr-", "disguised-host", "referer"].
+        filtered_prefixes (tuple, optional): prefixes to filter.
+            Defaults to ("host", "cookie", "x-ms-", "x-arr-", "disguised-host", "referer").
 
     Returns:
         dict: filtered headers
     """
-    clean_headers = {}
-    for key, value in headers.items():
-        for prefix in filtered_prefixes:
-            if key.lower().startswith(prefix):
-                break
-        else:
-            clean_headers[key] = value
-    return clean_headers
-
-
-async def get_body(request: Request):
-    """
-    Wrapper to get the body of a request
-
-    Args:
-        request (Request): fastapi request object
-
-    Returns:
-        bytes: body of request
-    """
-    return await request.body()
+    pattern = _prefix_pattern(tuple(filtered_prefixes))
+    return {key: value for key, value in headers.items() if not pattern.match(key)}
 
 
 @router.get("/{prefix}/{path:path}", response_class=Response)
-def upstream(request: Request, prefix: str, path: str, body=Depends(get_body)):
+async def upstream(request: Request, prefix: str, path: str):
     """
     Proxies a request to the upstream API
 
@@ -133,7 +124,6 @@ def upstream(request: Request, prefix: str, path: str, body=Depends(get_body)):
         request (Request): fastapi request object
         prefix (str): prefix of the upstream API
         path (str): path of the upstreams service
-        body (bytes, optional): body of the request. Defaults to Depends(get_body).
 
     Raises:
         HTTPException: if the upstream API returns an error
@@ -145,26 +135,38 @@ def upstream(request: Request, prefix: str, path: str, body=Depends(get_body)):
     headers = filter_headers(request.headers)
     url = httpx.URL(path=path, query=request.url.query.encode("utf-8"))
     upstream_client = client(request, prefix)
-    with upstream_client.stream(request.method, url, content=body, headers=headers) as origin:
-        if "location" in origin.headers:
-            base_url = f"{upstream_client.base_url}/"
-            if origin.headers["location"].startswith(base_url):
-                redir_path = origin.headers["location"].replace(base_url, "", 1)
-                origin.headers["location"] = (
-                    request.scope.get("root_path") + f"/{prefix}/{redir_path}"
-                )
-            elif origin.headers["location"].startswith("http"):
-                raise HTTPException(403, f"Redirect to {origin.headers['location']} not allowed.")
-        response = Response(status_code=origin.status_code)
-        response.body = b"".join(origin.iter_raw())
-        strip_output_headers = [
-            "set-cookie",
-            "transfer-encoding",
-            "content-length",
-            "server",
-            "date",
-            "connection",
-        ]
-        headers = filter_headers(origin.headers, filtered_prefixes=strip_output_headers)
-        response.init_headers(headers=headers)
-        return response
+    # stream the request body straight through rather than buffering it in memory, but
+    # only when the client actually sent one - attaching a stream unconditionally makes
+    # every request (including plain GETs) chunked, which some origins reject
+    content = None
+    if "content-length" in request.headers or "transfer-encoding" in request.headers:
+        content = request.stream()
+    origin_request = upstream_client.build_request(
+        request.method, url, content=content, headers=headers
+    )
+    origin = await upstream_client.send(origin_request, stream=True)
+    if "location" in origin.headers:
+        base_url = upstream_client.base_url_slash
+        if origin.headers["location"].startswith(base_url):
+            redir_path = origin.headers["location"].replace(base_url, "", 1)
+            origin.headers["location"] = request.scope.get("root_path") + f"/{prefix}/{redir_path}"
+        elif origin.headers["location"].startswith("http"):
+            await origin.aclose()
+            raise HTTPException(403, f"Redirect to {origin.headers['location']} not allowed.")
+    strip_output_headers = [
+        "set-cookie",
+        "transfer-encoding",
+        "content-length",
+        "server",
+        "date",
+        "connection",
+    ]
+    headers = filter_headers(origin.headers, filtered_prefixes=strip_output_headers)
+    # stream the origin body straight through in 64 KiB chunks; raw (still encoded)
+    # bytes are forwarded as-is since content-encoding passes through untouched
+    return StreamingResponse(
+        origin.aiter_raw(chunk_size=65536),
+        status_code=origin.status_code,
+        headers=headers,
+        background=BackgroundTask(origin.aclose),
+    )
@@ -1,8 +1,10 @@
 """
 Reporting helpers for PDF and HTML output
 """
+import functools
 import hashlib
 import importlib
+import io
 import pickle
 import tempfile
 from pathlib import Path
@@ -55,8 +57,24 @@ class EspartoReport:
     Reporting helpers
     """
 
-    base_css = tinycss2.parse_stylesheet(open(esparto.options.esparto_css, encoding="utf8").read())
-    pdf_css = Template(importlib.resources.read_text(f"{__package__}.templates", "esparto-pdf.css"))
+    @classmethod
+    @functools.cache
+    def base_css(cls) -> list:
+        """
+        Parse the esparto base stylesheet once per process (lazily, not at import)
+        """
+        with open(esparto.options.esparto_css, encoding="utf8") as css_file:
+            return tinycss2.parse_stylesheet(css_file.read())
+
+    @classmethod
+    @functools.cache
+    def pdf_css(cls) -> Template:
+        """
+        Load the pdf css template once per process (lazily, not at import)
+        """
+        return Template(
+            importlib.resources.read_text(f"{__package__}.templates", "esparto-pdf.css")
+        )
 
     def __init__(
         self,
@@ -132,16 +150,20 @@ class EspartoReport:
         """
         # Return an esparto page for reporting after customising css
         base_css = [
-            r for r in self.base_css if not hasattr(r, "at_keyword")
+            r for r in self.base_css() if not hasattr(r, "at_keyword")
         ]  # strip media/print styles so we can replace
 
         background = self.path / self.background
-        background_file = tempfile.NamedTemporaryFile(delete=False, mode="w+b", suffix="png")
-        background_file.write(background.read_bytes())
-        background_file.flush()
-        css_params["background"] = f"file://{background_file.name}"
+        if isinstance(background, Path):
+            # local files can be referenced by url directly - no temp copy needed
+            css_params["background"] = background.absolute().as_uri()
+        else:  # cloud paths still need downloading somewhere weasyprint can reach
+            background_file = tempfile.NamedTemporaryFile(delete=False, mode="w+b", suffix="png")
+            background_file.write(background.read_bytes())
+            background_file.flush()
+            css_params["background"] = f"file://{background_file.name}"
         extra_css = tinycss2.parse_stylesheet(
-            self.pdf_css.substitute(title=self.report_title, **css_params)
+            self.pdf_css().substitute(title=self.report_title, **css_params)
         )
         for rule in base_css + extra_css:
             self.pdf_css_file.write(rule.serialize())
@@ -158,10 +180,10 @@ class EspartoReport:
     def report_pdf(self, preview=True, savehtml=False):
         self.pdf.parent.mkdir(parents=True, exist_ok=True)
         self.zip.write_bytes(self.query_cache.read_bytes())
-        with tempfile.NamedTemporaryFile(mode="w+b", suffix=".pdf") as pdf_file_tmp:
-            html = self.report.save_pdf(pdf_file_tmp, return_html=True)
-            pdf_file_tmp.seek(0)
-            self.pdf.write_bytes(pdf_file_tmp.read())
+        # render into memory rather than round-tripping through a temp file on disk
+        pdf_bytes = io.BytesIO()
+        html = self.report.save_pdf(pdf_bytes, return_html=True)
+        self.pdf.write_bytes(pdf_bytes.getvalue())
 
         if savehtml:
             self.pdf.with_suffix(".html").write_text(html)
@@ -174,12 +196,13 @@ class EspartoReport:
     def rename_and_sort(self, df, names, rows=40, cols=40):
         # Rename columns based on dict
         df = df.rename(columns=names)
-        # Merge common columns
-        df = df.groupby(by=df.columns, axis=1).sum()
-        # Sort columns by values, top 40
-        df = df[df.sum(0).sort_values(ascending=False)[:cols].index]
-        # Sort rows by values, top 40
-        df = df.loc[df.sum(axis=1).sort_values(ascending=False)[:rows].index]
+        # Merge common columns - axis=1 groupby iterates labels in python, the
+        # transposed level groupby aggregates at numpy speed
+        df = df.T.groupby(level=0).sum().T
+        # Top 40 columns and rows by values - nlargest heap-selects top-k
+        # instead of fully sorting every column/row total
+        df = df[df.sum(0).nlargest(cols).index]
+        df = df.loc[df.sum(axis=1).nlargest(rows).index]
         return df
 
     @classmethod
@@ -197,15 +220,17 @@ class EspartoReport:
         """
         Annotates a dataframe based on quantile and category sizes, then groups small categories into other
         """
-        df = dataframe.copy(deep=True)
+        # shallow copy - only the category/field columns below are (re)assigned wholesale
+        df = dataframe.copy(deep=False)
         sizes = df.groupby(category)[metric].agg(agg).sort_values(ascending=False)
         maxmetric = sizes.quantile(quantile) * max_scale
         normal, oversized = sizes[sizes <= maxmetric], sizes[sizes > maxmetric]
         df[field] = df[category].isin(oversized.index)
+        categories = df[category]
         for others in (normal[max_categories:], oversized[max_categories:]):
-            df[category] = df[category].replace(
-                {label: f"{others.count()} Others" for label in others.index}
-            )
+            # mask with a single label beats a python-level replace over a big dict
+            categories = categories.mask(categories.isin(others.index), f"{others.count()} Others")
+        df[category] = categories
         return df
 
     @classmethod
@@ -213,19 +238,38 @@ class EspartoReport:
         """
         Return dataframe filtered by timespan
         """
-        df = df.copy(deep=True)
-        return df[df[col] >= (df[col].max() - pandas.to_timedelta(timespan))].reset_index()
+        # boolean slice already returns a new frame, so no upfront deep copy needed;
+        # sorted time columns (the usual Sentinel result shape) read the end in O(1)
+        if df.empty:
+            return df.reset_index()
+        end = df[col].iloc[-1] if df[col].is_monotonic_increasing else df[col].max()
+        return df[df[col] >= (end - pandas.to_timedelta(timespan))].reset_index()
 
     @classmethod
     def hash256(cls, obj, truncate: int = 16):
-        return hashlib.sha256(pickle.dumps(obj)).hexdigest()[:truncate]
+        if isinstance(obj, bytes):  # hash str/bytes directly, pickle everything else
+            data = obj
+        elif isinstance(obj, str):
+            data = obj.encode("utf8")
+        else:
+            data = pickle.dumps(obj, protocol=5)
+        return hashlib.sha256(data).hexdigest()[:truncate]
 
     @classmethod
     def hash_columns(cls, dataframe: pandas.DataFrame, columns: list):
         if not isinstance(columns, list):
             columns = [columns]
         for column in columns:
-            dataframe[column] = dataframe[column].apply(cls.hash256)
+            if dataframe[column].dtype == object:
+                # string columns hash their utf8 bytes directly with blake2b, which skips
+                # a pickle per cell and the slower sha256 primitive (these digests only
+                # anonymise report output, so no cryptographic requirement)
+                dataframe[column] = [
+                    hashlib.blake2b(str(value).encode("utf8"), digest_size=8).hexdigest()
+                    for value in dataframe[column].to_numpy()
+                ]
+            else:
+                dataframe[column] = dataframe[column].apply(cls.hash256)
 
     def show(self, section: str):
         return display.HTML(self.report[section].to_html(notebook_mode=True))